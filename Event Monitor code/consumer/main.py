@@ -4,6 +4,77 @@ import os
 import pymysql
 
 
+def extract_event_values(decoded_json):
+    message_id = decoded_json.get("message_id")
+    device_id = decoded_json.get("device_id")
+    temp_c = decoded_json.get("temp_c")
+    temp_f = decoded_json.get("temp_f")
+    timestamp_utc = decoded_json.get("timestamp_utc")
+    event_type = decoded_json.get("event_type")
+    mode = decoded_json.get("mode")
+
+    if not message_id:
+        print("Missing message_id in payload")
+        return None
+
+    if timestamp_utc:
+        timestamp_utc = timestamp_utc.replace("T", " ").replace("Z", "")
+        if "." in timestamp_utc:
+            timestamp_utc = timestamp_utc.split(".")[0]
+
+    print("Extracted values:")
+    print("message_id =", message_id)
+    print("device_id =", device_id)
+    print("temp_c =", temp_c)
+    print("temp_f =", temp_f)
+    print("timestamp_utc =", timestamp_utc)
+    print("event_type =", event_type)
+    print("mode =", mode)
+
+    return {
+        "message_id": message_id,
+        "device_id": device_id,
+        "temp_c": temp_c,
+        "temp_f": temp_f,
+        "timestamp_utc": timestamp_utc,
+    }
+
+
+def insert_event(cursor, values):
+    cursor.execute(
+        "SELECT COUNT(*) AS cnt FROM messages WHERE message_id = %s",
+        (values["message_id"],)
+    )
+    result = cursor.fetchone()
+    is_duplicate = 1 if result["cnt"] > 0 else 0
+
+    insert_sql = """
+        INSERT INTO messages (
+            message_id,
+            device_id,
+            temp_c,
+            temp_f,
+            timestamp_utc,
+            is_duplicate
+        )
+        VALUES (%s, %s, %s, %s, %s, %s)
+    """
+
+    cursor.execute(
+        insert_sql,
+        (
+            values["message_id"],
+            values["device_id"],
+            values["temp_c"],
+            values["temp_f"],
+            values["timestamp_utc"],
+            is_duplicate
+        )
+    )
+
+    return is_duplicate
+
+
 def process_cloud_event(cloud_event):
     connection = None
 
@@ -23,7 +94,6 @@ def process_cloud_event(cloud_event):
             return
 
         message = envelope.get("message", {})
-        attributes = message.get("attributes", {})
         data_b64 = message.get("data")
 
         decoded_json = {}
@@ -38,31 +108,21 @@ def process_cloud_event(cloud_event):
                 print("Decoded payload is not valid JSON")
                 decoded_json = {}
 
-        message_id = decoded_json.get("message_id") or attributes.get("message_id")
-        device_id = decoded_json.get("device_id") or attributes.get("device_id")
-        temp_c = decoded_json.get("temp_c")
-        temp_f = decoded_json.get("temp_f")
-        timestamp_utc = decoded_json.get("timestamp_utc")
-        event_type = decoded_json.get("event_type") or attributes.get("event_type")
-        mode = decoded_json.get("mode") or attributes.get("mode")
-
-        if not message_id:
-            print("Missing message_id in both payload and attributes")
-            return
+        # The producer packs several events into one Pub/Sub message as a JSON array.
+        if isinstance(decoded_json, list):
+            events = [event for event in decoded_json if isinstance(event, dict)]
+            print(f"Batch message with {len(events)} events")
+        else:
+            events = [decoded_json]
 
-        if timestamp_utc:
-            timestamp_utc = timestamp_utc.replace("T", " ").replace("Z", "")
-            if "." in timestamp_utc:
-                timestamp_utc = timestamp_utc.split(".")[0]
+        rows = []
+        for event in events:
+            values = extract_event_values(event)
+            if values:
+                rows.append(values)
 
-        print("Extracted values:")
-        print("message_id =", message_id)
-        print("device_id =", device_id)
-        print("temp_c =", temp_c)
-        print("temp_f =", temp_f)
-        print("timestamp_utc =", timestamp_utc)
-        print("event_type =", event_type)
-        print("mode =", mode)
+        if not rows:
+            return
 
         connection = pymysql.connect(
             unix_socket=f"/cloudsql/{os.environ['INSTANCE_CONNECTION_NAME']}",
@@ -73,40 +133,21 @@ def process_cloud_event(cloud_event):
             autocommit=False
         )
 
+        inserted = []
         with connection.cursor() as cursor:
-            cursor.execute(
-                "SELECT COUNT(*) AS cnt FROM messages WHERE message_id = %s",
-                (message_id,)
-            )
-            result = cursor.fetchone()
-            is_duplicate = 1 if result["cnt"] > 0 else 0
-
-            insert_sql = """
-                INSERT INTO messages (
-                    message_id,
-                    device_id,
-                    temp_c,
-                    temp_f,
-                    timestamp_utc,
-                    is_duplicate
-                )
-                VALUES (%s, %s, %s, %s, %s, %s)
-            """
-
-            cursor.execute(
-                insert_sql,
-                (
-                    message_id,
-                    device_id,
-                    temp_c,
-                    temp_f,
-                    timestamp_utc,
-                    is_duplicate
-                )
-            )
+            for values in rows:
+                # A bad row is logged and skipped so it cannot force redelivery of the rest of the batch.
+                # Connection and other operational errors still raise, and Pub/Sub redelivers the message.
+                try:
+                    is_duplicate = insert_event(cursor, values)
+                except (pymysql.err.DataError, pymysql.err.IntegrityError) as e:
+                    print(f"Skipping bad event message_id={values['message_id']}: {e}")
+                    continue
+                inserted.append((values["message_id"], is_duplicate))
 
         connection.commit()
-        print(f"Insert successful: message_id={message_id}, duplicate={is_duplicate}")
+        for message_id, is_duplicate in inserted:
+            print(f"Insert successful: message_id={message_id}, duplicate={is_duplicate}")
 
     except Exception as e:
         print("DATABASE ERROR:", str(e))
@@ -114,4 +155,4 @@ def process_cloud_event(cloud_event):
 
     finally:
         if connection:
-            connection.close()
\ No newline at end of file
+            connection.close()
@@ -1,23 +1,31 @@
 # The live mode of this script is hardware dependant and requires the raspberry pi and the DS18B20 to produce output
 
+import asyncio
+import collections
 import glob
 import json
 import logging
+import logging.handlers
 import os
 import queue
 import random
 import socket
+import subprocess
 import threading
 import time
 import tkinter as tk
 from tkinter import ttk
-from datetime import datetime
 
 try:
     from google.cloud import pubsub_v1
 except Exception:
     pubsub_v1 = None
 
+try:
+    import orjson
+except Exception:
+    orjson = None
+
 # Combined monitor:
 # - Live mode (radio): DS18B20 on 1-wire
 # - Simulated mode (radio): random +/- 5C changes
@@ -49,13 +57,41 @@ EVENT_TYPE_CODE_MAP = {
 }
 
 BASE_TEMP_C = 22.0
+C_TO_F_SCALE = 9.0 / 5.0
 MAX_VARIATION_C = 5.0
 LIVE_INTERVAL_S = 1.0
+W1_DEVICES_DIR = "/sys/bus/w1/devices/"
+DS18B20_RETRY_MAX_S = 30.0
+W1_SLAVE_READ_BYTES = 256
+W1_CRC_RETRIES = 2
+W1_CRC_RETRY_DELAY_S = 0.4
+UI_HEARTBEAT_MS = 1000
+OUTPUT_QUEUE_MAX_MESSAGES = 1000
+LOG_MAX_LINES = 2000
+LOG_TRIM_TO_LINES = 1000
+MESSAGE_ID_RESERVE_BLOCK = 16
 SPOOL_FILE = "spool_unsent_events.jsonl"
+LOG_BUFFER_BYTES = 1 << 16
+
+PUBLISH_BATCH_MAX_MESSAGES = 100
+PUBLISH_BATCH_MAX_BYTES = 1_000_000
+PUBLISH_BATCH_MAX_LATENCY_S = 0.1
+PUBLISH_RESULT_TIMEOUT_S = 5
+PUBLISH_PAYLOAD_MAX_BYTES = 900_000
+SPOOL_BUFFER_BYTES = 1 << 16
 
 _device_path = None
 _rom = None
 _ds18_initialized = False
+_ds18_last_attempt = None
+_ds18_fail_count = 0
+_w1_modules_loaded = False
+_sensor_fd = None
+
+_ts_cache_sec = None
+_ts_cache_str = ""
+_log_ts_sec = None
+_log_ts_str = ""
 
 
 def load_config(log):
@@ -128,7 +164,7 @@ def next_series_value(series):
 
 
 def init_ds18b20(log):
-    global _device_path, _rom, _ds18_initialized
+    global _device_path, _rom, _ds18_initialized, _ds18_last_attempt, _ds18_fail_count, _w1_modules_loaded
 
     if _ds18_initialized:
         return True
@@ -137,19 +173,29 @@ def init_ds18b20(log):
         log.info("Live mode is not supported on Windows")
         return False
 
+    now = time.monotonic()
+    retry_delay = min(2 ** _ds18_fail_count, DS18B20_RETRY_MAX_S)
+    if _ds18_last_attempt is not None and now - _ds18_last_attempt < retry_delay:
+        return False
+    _ds18_last_attempt = now
+    _ds18_fail_count += 1
+
     try:
-        os.system("modprobe w1-gpio")
-        os.system("modprobe w1-therm")
+        matches = glob.glob(W1_DEVICES_DIR + "28*")
+        if not matches and not _w1_modules_loaded:
+            _w1_modules_loaded = True
+            for module in ("w1-gpio", "w1-therm"):
+                subprocess.run(["modprobe", module], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
+            matches = glob.glob(W1_DEVICES_DIR + "28*")
 
-        base_dir = "/sys/bus/w1/devices/"
-        matches = glob.glob(base_dir + "28*")
         if not matches:
-            log.error("No DS18B20 device found under %s", base_dir)
+            log.error("No DS18B20 device found under %s", W1_DEVICES_DIR)
             return False
 
         _device_path = matches[0]
         _rom = _device_path.split("/")[-1]
         _ds18_initialized = True
+        _ds18_fail_count = 0
         log.info("DS18B20 initialized rom=%s path=%s", _rom, _device_path)
         return True
     except Exception as exc:
@@ -158,116 +204,251 @@ def init_ds18b20(log):
 
 
 def read_temp_raw_live():
-    with open(_device_path + "/w1_slave", "r", encoding="utf-8") as sensor_file:
-        valid, temp = sensor_file.readlines()
-    return valid, temp
+    global _sensor_fd
+
+    # sysfs attributes can be re-read from offset 0, so the descriptor is reused.
+    try:
+        if _sensor_fd is None:
+            _sensor_fd = os.open(_device_path + "/w1_slave", os.O_RDONLY)
+        else:
+            os.lseek(_sensor_fd, 0, os.SEEK_SET)
+        return os.read(_sensor_fd, W1_SLAVE_READ_BYTES)
+    except OSError:
+        if _sensor_fd is not None:
+            os.close(_sensor_fd)
+            _sensor_fd = None
+        raise
 
 
 def read_temp_live(log):
-    valid, temp = read_temp_raw_live()
-    while "YES" not in valid:
-        time.sleep(0.2)
-        valid, temp = read_temp_raw_live()
-
-    pos = temp.index("t=")
-    temp_string = temp[pos + 2 :]
-    temp_c = float(temp_string) / 1000.0
-    temp_f = temp_c * (9.0 / 5.0) + 32.0
-    log.info("rom=%s temp_c=%.3f temp_f=%.3f", _rom, temp_c, temp_f)
+    data = read_temp_raw_live()
+    retries = 0
+    while b"YES" not in data:
+        if retries >= W1_CRC_RETRIES:
+            raise ValueError(f"DS18B20 CRC check failed rom={_rom}")
+        retries += 1
+        time.sleep(W1_CRC_RETRY_DELAY_S)
+        data = read_temp_raw_live()
+
+    pos = data.rfind(b"t=")
+    temp_c = int(data[pos + 2 :].strip()) / 1000.0
+    temp_f = temp_c * C_TO_F_SCALE + 32.0
+    if log.isEnabledFor(logging.INFO):
+        log.info("rom=%s temp_c=%.3f temp_f=%.3f", _rom, temp_c, temp_f)
     return temp_c, temp_f
 
 
-def build_event_payload(device_id, mode, temp_c, temp_f, sequence, message_id, event_type="TEMP_READING", extra_fields=None):
-    payload = {
-        "message_id": message_id,
+def utc_timestamp():
+    global _ts_cache_sec, _ts_cache_str
+
+    now = time.time()
+    sec = int(now)
+    if sec != _ts_cache_sec:
+        _ts_cache_str = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(sec))
+        _ts_cache_sec = sec
+    return f"{_ts_cache_str}.{int((now - sec) * 1000):03d}Z"
+
+
+def local_log_timestamp():
+    global _log_ts_sec, _log_ts_str
+
+    sec = int(time.time())
+    if sec != _log_ts_sec:
+        _log_ts_str = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(sec))
+        _log_ts_sec = sec
+    return _log_ts_str
+
+
+def now_hms():
+    return time.strftime("%H:%M:%S")
+
+
+def event_payload_template(device_id, mode, event_type):
+    return {
+        "message_id": None,
         "device_id": device_id,
         "mode": mode,
-        "temp_c": temp_c,
-        "temp_f": temp_f,
-        "timestamp_utc": datetime.utcnow().isoformat() + "Z",
-        "sequence": sequence,
+        "temp_c": None,
+        "temp_f": None,
+        "timestamp_utc": None,
+        "sequence": None,
         "event_type": event_type,
     }
+
+
+def build_event_payload(template, temp_c, temp_f, sequence, message_id, extra_fields=None):
+    payload = template.copy()
+    payload["message_id"] = message_id
+    payload["temp_c"] = temp_c
+    payload["temp_f"] = temp_f
+    payload["timestamp_utc"] = utc_timestamp()
+    payload["sequence"] = sequence
     if extra_fields:
         payload.update(extra_fields)
     return payload
 
 
-def spool_event(event_payload, log):
+def serialize_event(event_payload):
+    if orjson is not None:
+        return orjson.dumps(event_payload)
+    return json.dumps(event_payload).encode("utf-8")
+
+
+def pack_events(event_payloads):
+    events = []
+    buffer = bytearray(b"[")
+    for event_payload in event_payloads:
+        data = serialize_event(event_payload)
+        if events and len(buffer) + len(data) + 1 > PUBLISH_PAYLOAD_MAX_BYTES:
+            buffer[-1:] = b"]"
+            yield events, bytes(buffer)
+            events = []
+            buffer = bytearray(b"[")
+        events.append(event_payload)
+        buffer += data
+        buffer += b","
+
+    if events:
+        buffer[-1:] = b"]"
+        yield events, bytes(buffer)
+
+
+def open_spool_file(log):
     try:
-        with open(SPOOL_FILE, "a", encoding="utf-8") as spool_file:
-            spool_file.write(json.dumps(event_payload) + "\n")
+        return open(SPOOL_FILE, "ab", buffering=SPOOL_BUFFER_BYTES)
+    except Exception as exc:
+        log.error("Failed opening spool file: %s", exc)
+        return None
+
+
+def spool_event(event_payload, pending_spool):
+    pending_spool.append(serialize_event(event_payload) + b"\n")
+
+
+def flush_spool(spool_file, pending_spool, log):
+    if not pending_spool:
+        return
+
+    if spool_file is None:
+        log.error("Spool file unavailable; dropped %d events", len(pending_spool))
+        pending_spool.clear()
+        return
+
+    try:
+        spool_file.writelines(pending_spool)
+        spool_file.flush()
     except Exception as exc:
         log.error("Failed writing spool file: %s", exc)
+    finally:
+        pending_spool.clear()
+
+
+class CachedTimeFormatter(logging.Formatter):
+    def __init__(self, fmt):
+        super().__init__(fmt)
+        self._cached_sec = None
+        self._cached_time = ""
+
+    def formatTime(self, record, datefmt=None):
+        sec = int(record.created)
+        if sec != self._cached_sec:
+            self._cached_time = time.strftime(self.default_time_format, self.converter(sec))
+            self._cached_sec = sec
+        return self.default_msec_format % (self._cached_time, record.msecs)
+
+
+class QueueDrainFileHandler(logging.FileHandler):
+    def __init__(self, filename, log_queue):
+        super().__init__(filename)
+        self.log_queue = log_queue
+
+    def _open(self):
+        return open(self.baseFilename, self.mode, buffering=LOG_BUFFER_BYTES, encoding=self.encoding, errors=self.errors)
+
+    def flush(self):
+        if self.log_queue.empty():
+            super().flush()
 
 
 def build_logger():
     log = logging.getLogger("sensor_logger")
     log.setLevel(logging.INFO)
+    listener = None
     if not log.handlers:
-        formatter = logging.Formatter("%(asctime)s %(message)s")
-        handler = logging.FileHandler("sensor_readings.log")
-        handler.setFormatter(formatter)
-        log.addHandler(handler)
-    return log
+        formatter = CachedTimeFormatter("%(asctime)s %(message)s")
+        log_queue = queue.SimpleQueue()
+        file_handler = QueueDrainFileHandler("sensor_readings.log", log_queue)
+        file_handler.setFormatter(formatter)
+        log.addHandler(logging.handlers.QueueHandler(log_queue))
+        listener = logging.handlers.QueueListener(log_queue, file_handler, respect_handler_level=True)
+        listener.start()
+    return log, listener
+
 
+def drain_publish_queue(publish_queue):
+    try:
+        batch = [publish_queue.get(timeout=0.2)]
+    except queue.Empty:
+        return []
 
-def publisher_worker(running_event, publish_queue, output_queue, log, is_publish_enabled):
+    while len(batch) < PUBLISH_BATCH_MAX_MESSAGES:
+        try:
+            batch.append(publish_queue.get_nowait())
+        except queue.Empty:
+            break
+    return batch
+
+
+def publisher_worker(running_event, publish_queue, post_output, log, publish_enabled):
+    asyncio.run(publish_events(running_event, publish_queue, post_output, log, publish_enabled))
+
+
+async def publish_events(running_event, publish_queue, post_output, log, publish_enabled):
+    loop = asyncio.get_running_loop()
     publisher = None
     topic_path = None
     fallback_spool_only = False
     fallback_status_sent = False
     published_ids = set()
+    in_flight = set()
+    pending_spool = []
+    spool_file = open_spool_file(log)
 
     if pubsub_v1 is None:
         fallback_spool_only = True
     else:
         try:
-            publisher = pubsub_v1.PublisherClient()
+            batch_settings = pubsub_v1.types.BatchSettings(
+                max_messages=PUBLISH_BATCH_MAX_MESSAGES,
+                max_bytes=PUBLISH_BATCH_MAX_BYTES,
+                max_latency=PUBLISH_BATCH_MAX_LATENCY_S,
+            )
+            publisher = pubsub_v1.PublisherClient(batch_settings=batch_settings)
             topic_path = publisher.topic_path(GCP_PROJECT_ID, PUBSUB_TOPIC_ID)
         except Exception as exc:
             fallback_spool_only = True
             log.error("Pub/Sub unavailable; falling back to spool-only mode: %s", exc)
 
-    while running_event.is_set() or not publish_queue.empty():
-        try:
-            event_payload = publish_queue.get(timeout=0.2)
-        except queue.Empty:
-            continue
-
-        is_duplicate = event_payload["message_id"] in published_ids
-
-        if fallback_spool_only:
-            spool_event(event_payload, log)
-            if not fallback_status_sent:
-                output_queue.put(("status", "Pub/Sub unavailable: spooling enabled"))
-                fallback_status_sent = True
-            publish_queue.task_done()
-            continue
-
-        if not is_publish_enabled():
-            spool_event(event_payload, log)
-            output_queue.put(("status", "Publish disabled: event spooled"))
-            log.info("Publish disabled; spooled message_id=%s", event_payload["message_id"])
-            publish_queue.task_done()
-            continue
+    def spool_failed_publish(events, exc):
+        for event_payload in events:
+            spool_event(event_payload, pending_spool)
+            log.error("Publish failed for message_id=%s: %s", event_payload["message_id"], exc)
+        flush_spool(spool_file, pending_spool, log)
+        post_output(("status", "Publish failed: event spooled"))
+        post_output(("status", f"Pub/Sub init error: {exc}"))
 
+    async def confirm_publish(events, future):
         try:
-            data = json.dumps(event_payload).encode("utf-8")
-            future = publisher.publish(
-                topic_path,
-                data,
-                message_id=event_payload["message_id"],
-                device_id=event_payload["device_id"],
-                mode=event_payload["mode"],
-                event_type=event_payload["event_type"],
-            )
-            pubsub_id = future.result(timeout=5)
+            pubsub_id = await asyncio.wait_for(asyncio.wrap_future(future), PUBLISH_RESULT_TIMEOUT_S)
+        except Exception as exc:
+            spool_failed_publish(events, exc)
+            return
 
-            if is_duplicate:
-                output_queue.put(("status", f"Published duplicate event {event_payload['message_id']}"))
+        for event_payload in events:
+            if event_payload["message_id"] in published_ids:
+                post_output(("status", f"Published duplicate event {event_payload['message_id']}"))
             else:
-                output_queue.put(("status", f"Published event {event_payload['message_id']}"))
+                post_output(("status", f"Published event {event_payload['message_id']}"))
 
             log.info(
                 "Published pubsub_id=%s message_id=%s sequence=%s",
@@ -276,16 +457,50 @@ def publisher_worker(running_event, publish_queue, output_queue, log, is_publish
                 event_payload["sequence"],
             )
             published_ids.add(event_payload["message_id"])
-        except Exception as exc:
-            spool_event(event_payload, log)
-            output_queue.put(("status", "Publish failed: event spooled"))
-            log.error("Publish failed for message_id=%s: %s", event_payload["message_id"], exc)
-            output_queue.put(("status", f"Pub/Sub init error: {exc}"))
-        finally:
-            publish_queue.task_done()
 
+    try:
+        while running_event.is_set() or not publish_queue.empty():
+            batch = await loop.run_in_executor(None, drain_publish_queue, publish_queue)
+            outgoing = []
+            spooled = []
+
+            for event_payload in batch:
+                if fallback_spool_only or not publish_enabled[0]:
+                    spool_event(event_payload, pending_spool)
+                    spooled.append(event_payload)
+                    continue
+
+                outgoing.append(event_payload)
 
-def temp_worker(running_event, output_queue, publish_queue, log, is_sim_mode, is_publish_enabled, get_config, next_message_id):
+            if spooled:
+                flush_spool(spool_file, pending_spool, log)
+                if fallback_spool_only:
+                    if not fallback_status_sent:
+                        post_output(("status", "Pub/Sub unavailable: spooling enabled"))
+                        fallback_status_sent = True
+                else:
+                    for event_payload in spooled:
+                        post_output(("status", "Publish disabled: event spooled"))
+                        log.info("Publish disabled; spooled message_id=%s", event_payload["message_id"])
+
+            for events, data in pack_events(outgoing):
+                try:
+                    future = publisher.publish(topic_path, data, event_count=str(len(events)))
+                    task = loop.create_task(confirm_publish(events, future))
+                    in_flight.add(task)
+                    task.add_done_callback(in_flight.discard)
+                except Exception as exc:
+                    spool_failed_publish(events, exc)
+
+        if in_flight:
+            await asyncio.gather(*in_flight)
+    finally:
+        flush_spool(spool_file, pending_spool, log)
+        if spool_file is not None:
+            spool_file.close()
+
+
+def temp_worker(stop_event, post_output, post_temp, publish_queue, log, sim_mode_enabled, get_config, next_message_id):
     current_temp_c = BASE_TEMP_C
     last_mode = None
     sequence = 0
@@ -295,18 +510,34 @@ def temp_worker(running_event, output_queue, publish_queue, log, is_sim_mode, is
     recovery_cycles = 0
     excursion_direction = 1
     excursion_target = None
-
-    while running_event.is_set():
-        sim_mode = is_sim_mode()
-
-        if os.name == "nt" and not sim_mode:
-            output_queue.put(("force_sim", "Live mode is not supported on Windows; switched to Simulated"))
+    last_posted = None
+    template_device_id = None
+    template_mode = None
+    reading_template = None
+
+    rng = random.Random()
+    uniform = rng.uniform
+    rand = rng.random
+    wait = stop_event.wait
+    monotonic = time.monotonic
+    enqueue_event = publish_queue.put
+    log_info = log.info
+    is_windows = os.name == "nt"
+    is_stopped = stop_event.is_set
+    next_sample = monotonic()
+
+    while not is_stopped():
+        sim_mode = sim_mode_enabled[0]
+        info_enabled = log.isEnabledFor(logging.INFO)
+
+        if is_windows and not sim_mode:
+            post_output(("force_sim", "Live mode is not supported on Windows; switched to Simulated"))
             sim_mode = True
 
         if sim_mode != last_mode:
             mode_text = "Simulated mode active" if sim_mode else "Live mode active"
-            output_queue.put(("status", mode_text))
-            log.info(mode_text)
+            post_output(("status", mode_text))
+            log_info(mode_text)
             last_mode = sim_mode
 
         try:
@@ -325,34 +556,34 @@ def temp_worker(running_event, output_queue, publish_queue, log, is_sim_mode, is
 
                 if excursion_cycles > 0 and excursion_target is not None:
                     direction = 1 if excursion_target > current_temp_c else -1
-                    temp_step = direction * random.uniform(1.0, 1.8)
+                    temp_step = direction * uniform(1.0, 1.8)
                     excursion_cycles -= 1
                     crossed_threshold = current_temp_c < threshold_low or current_temp_c > threshold_high
                     reached_target = abs(excursion_target - current_temp_c) <= 0.8
                     if crossed_threshold or reached_target or excursion_cycles == 0:
-                        recovery_cycles = random.randint(4, 8)
+                        recovery_cycles = rng.randint(4, 8)
                         excursion_target = None
                         excursion_cycles = 0
                 elif recovery_cycles > 0:
                     direction = 1 if normal_mid > current_temp_c else -1
-                    temp_step = direction * random.uniform(0.5, 0.9)
+                    temp_step = direction * uniform(0.5, 0.9)
                     recovery_cycles -= 1
                 else:
-                    if random.random() < 0.15:
+                    if rand() < 0.15:
                         sim_trend *= -1
-                    temp_step = (sim_trend * random.uniform(0.1, 0.45)) + random.uniform(-0.2, 0.2)
+                    temp_step = (sim_trend * uniform(0.1, 0.45)) + uniform(-0.2, 0.2)
 
                     can_breach_high = threshold_high < sim_max_temp
                     can_breach_low = threshold_low > sim_min_temp
-                    if alerts_enabled and not in_alert_state and random.random() < 0.12 and (can_breach_high or can_breach_low):
+                    if alerts_enabled and not in_alert_state and rand() < 0.12 and (can_breach_high or can_breach_low):
                         options = [d for d in [1, -1] if (d == 1 and can_breach_high) or (d == -1 and can_breach_low)]
-                        excursion_direction = random.choice(options)
+                        excursion_direction = rng.choice(options)
                         if excursion_direction > 0:
-                            excursion_target = min(sim_max_temp - 0.2, threshold_high + random.uniform(1.0, 2.5))
+                            excursion_target = min(sim_max_temp - 0.2, threshold_high + uniform(1.0, 2.5))
                         else:
-                            excursion_target = max(sim_min_temp + 0.2, threshold_low - random.uniform(1.0, 2.5))
-                        excursion_cycles = random.randint(10, 18)
-                        temp_step += excursion_direction * random.uniform(0.8, 1.2)
+                            excursion_target = max(sim_min_temp + 0.2, threshold_low - uniform(1.0, 2.5))
+                        excursion_cycles = rng.randint(10, 18)
+                        temp_step += excursion_direction * uniform(0.8, 1.2)
 
                 current_temp_c += temp_step
 
@@ -364,30 +595,39 @@ def temp_worker(running_event, output_queue, publish_queue, log, is_sim_mode, is
                     sim_trend = 1
 
                 temp_c = current_temp_c
-                temp_f = temp_c * (9.0 / 5.0) + 32.0
-                output_queue.put(("temp", temp_c, temp_f))
-                log.info("sim temp_c=%.3f temp_f=%.3f", temp_c, temp_f)
+                temp_f = temp_c * C_TO_F_SCALE + 32.0
+                if info_enabled:
+                    log_info("sim temp_c=%.3f temp_f=%.3f", temp_c, temp_f)
                 device_id = config["device_id_sim"]
                 mode = "sim"
             else:
                 if not init_ds18b20(log):
-                    output_queue.put(("status", "Live mode: DS18B20 not available"))
-                    time.sleep(LIVE_INTERVAL_S)
+                    post_output(("status", "Live mode: DS18B20 not available"))
+                    wait(LIVE_INTERVAL_S)
                     continue
 
                 temp_c, temp_f = read_temp_live(log)
-                output_queue.put(("temp", temp_c, temp_f))
                 device_id = config["device_id_live"]
                 mode = "live"
 
+            posted = (round(temp_c * 1000), round(temp_f * 1000))
+            if posted != last_posted:
+                post_temp(*posted)
+                last_posted = posted
+
+            if device_id != template_device_id or mode != template_mode:
+                reading_template = event_payload_template(device_id, mode, "TEMP_READING")
+                template_device_id = device_id
+                template_mode = mode
+
             sequence += 1
             message_id = next_message_id(mode, "TEMP_READING")
-            event_payload = build_event_payload(device_id, mode, temp_c, temp_f, sequence, message_id)
-            publish_queue.put(event_payload)
+            event_payload = build_event_payload(reading_template, temp_c, temp_f, sequence, message_id)
+            enqueue_event(event_payload)
 
-            if duplicate_enabled and random.random() * 100.0 < duplicate_rate_percent:
-                publish_queue.put(dict(event_payload))
-                output_queue.put(("status", f"Queued duplicate event {event_payload['message_id']}"))
+            if duplicate_enabled and rand() * 100.0 < duplicate_rate_percent:
+                enqueue_event(dict(event_payload))
+                post_output(("status", f"Queued duplicate event {event_payload['message_id']}"))
 
             if alerts_enabled:
                 is_out_of_threshold = temp_c < threshold_low or temp_c > threshold_high
@@ -397,13 +637,11 @@ def temp_worker(running_event, output_queue, publish_queue, log, is_sim_mode, is
                     sequence += 1
                     threshold_message_id = next_message_id(mode, "TEMP_THRESHOLD_EXCEEDED")
                     threshold_payload = build_event_payload(
-                        device_id,
-                        mode,
+                        event_payload_template(device_id, mode, "TEMP_THRESHOLD_EXCEEDED"),
                         temp_c,
                         temp_f,
                         sequence,
                         threshold_message_id,
-                        event_type="TEMP_THRESHOLD_EXCEEDED",
                         extra_fields={
                             "temperature_c": temp_c,
                             "temperature_f": temp_f,
@@ -412,30 +650,28 @@ def temp_worker(running_event, output_queue, publish_queue, log, is_sim_mode, is
                             "alerts_enabled": alerts_enabled,
                         },
                     )
-                    publish_queue.put(threshold_payload)
-                    output_queue.put(
+                    enqueue_event(threshold_payload)
+                    post_output(
                         (
                             "status",
                             f"{device_id} TEMP_THRESHOLD_EXCEEDED temp={temp_c:.1f}C low={threshold_low:g} high={threshold_high:g}",
                         )
                     )
 
-                    if duplicate_enabled and random.random() * 100.0 < duplicate_rate_percent:
-                        publish_queue.put(dict(threshold_payload))
-                        output_queue.put(("status", f"Queued duplicate event {threshold_payload['message_id']}"))
+                    if duplicate_enabled and rand() * 100.0 < duplicate_rate_percent:
+                        enqueue_event(dict(threshold_payload))
+                        post_output(("status", f"Queued duplicate event {threshold_payload['message_id']}"))
 
                 elif in_alert_state and not is_out_of_threshold:
                     in_alert_state = False
                     sequence += 1
                     recover_message_id = next_message_id(mode, "TEMP_THRESHOLD_RECOVERED")
                     recover_payload = build_event_payload(
-                        device_id,
-                        mode,
+                        event_payload_template(device_id, mode, "TEMP_THRESHOLD_RECOVERED"),
                         temp_c,
                         temp_f,
                         sequence,
                         recover_message_id,
-                        event_type="TEMP_THRESHOLD_RECOVERED",
                         extra_fields={
                             "temperature_c": temp_c,
                             "temperature_f": temp_f,
@@ -444,37 +680,50 @@ def temp_worker(running_event, output_queue, publish_queue, log, is_sim_mode, is
                             "alerts_enabled": alerts_enabled,
                         },
                     )
-                    publish_queue.put(recover_payload)
-                    output_queue.put(("status", f"{device_id} TEMP_THRESHOLD_RECOVERED temp={temp_c:.1f}C"))
+                    enqueue_event(recover_payload)
+                    post_output(("status", f"{device_id} TEMP_THRESHOLD_RECOVERED temp={temp_c:.1f}C"))
 
-                    if duplicate_enabled and random.random() * 100.0 < duplicate_rate_percent:
-                        publish_queue.put(dict(recover_payload))
-                        output_queue.put(("status", f"Queued duplicate event {recover_payload['message_id']}"))
+                    if duplicate_enabled and rand() * 100.0 < duplicate_rate_percent:
+                        enqueue_event(dict(recover_payload))
+                        post_output(("status", f"Queued duplicate event {recover_payload['message_id']}"))
 
-            time.sleep(publish_interval)
+            next_sample += publish_interval
+            delay = next_sample - monotonic()
+            if delay < 0:
+                next_sample = monotonic()
+                delay = 0
+            wait(delay)
 
         except Exception as exc:
-            output_queue.put(("status", "Temp read error"))
+            post_output(("status", "Temp read error"))
             log.error("Temp worker error: %s", exc)
-            time.sleep(1)
+            wait(1)
+
+
+def temp_sampler(alive_event, start_event, stop_event, *worker_args):
+    while alive_event.is_set():
+        start_event.wait()
+        start_event.clear()
+        if alive_event.is_set():
+            temp_worker(stop_event, *worker_args)
 
 
 def main():
-    log = build_logger()
+    log, log_listener = build_logger()
     config = load_config(log)
-    output_queue = queue.Queue()
-    publish_queue = queue.Queue()
+    output_queue = collections.deque(maxlen=OUTPUT_QUEUE_MAX_MESSAGES)
+    publish_queue = queue.SimpleQueue()
 
-    temp_running = threading.Event()
+    temp_stopped = threading.Event()
+    temp_stopped.set()
+    temp_alive = threading.Event()
+    temp_start = threading.Event()
     publish_running = threading.Event()
     temp_thread = None
     publish_thread = None
 
-    mode_lock = threading.Lock()
-    sim_mode_enabled = True
-
-    publish_lock = threading.Lock()
-    publish_enabled = False
+    sim_mode_enabled = [True]
+    publish_enabled = [False]
 
     config_lock = threading.Lock()
 
@@ -485,6 +734,30 @@ def main():
     root.title("Event Monitor")
     root.geometry("880x620")
 
+    ui_wake_pending = [False]
+    # event_generate from a worker thread blocks until the Tk thread services it.
+    ui_closing = [False]
+
+    latest_reading = collections.deque(maxlen=1)
+
+    def post_output(message):
+        output_queue.append(message)
+        wake_ui()
+
+    def post_temp(milli_c, milli_f):
+        latest_reading.append((milli_c, milli_f))
+        wake_ui()
+
+    def wake_ui():
+        if ui_wake_pending[0] or ui_closing[0]:
+            return
+
+        ui_wake_pending[0] = True
+        try:
+            root.event_generate("<<NewData>>", when="tail")
+        except (tk.TclError, RuntimeError):
+            ui_wake_pending[0] = False
+
     style = ttk.Style(root)
     try:
         style.theme_use("clam")
@@ -547,44 +820,49 @@ def main():
     log_group.columnconfigure(0, weight=1)
     log_group.rowconfigure(0, weight=1)
 
-    log_text = tk.Text(log_group, height=12, state="disabled", wrap="word", font=log_font, relief="flat")
-    log_text.grid(row=0, column=0, sticky="nsew")
+    log_listbox = tk.Listbox(log_group, height=12, font=log_font, relief="flat", activestyle="none")
+    log_listbox.grid(row=0, column=0, sticky="nsew")
 
-    log_scrollbar = ttk.Scrollbar(log_group, orient="vertical", command=log_text.yview)
+    log_scrollbar = ttk.Scrollbar(log_group, orient="vertical", command=log_listbox.yview)
     log_scrollbar.grid(row=0, column=1, sticky="ns")
-    log_text.configure(yscrollcommand=log_scrollbar.set)
+    log_listbox.configure(yscrollcommand=log_scrollbar.set)
+
+    log_xscrollbar = ttk.Scrollbar(log_group, orient="horizontal", command=log_listbox.xview)
+    log_xscrollbar.grid(row=1, column=0, sticky="ew")
+    log_listbox.configure(xscrollcommand=log_xscrollbar.set)
 
     button_frame = ttk.Frame(container)
     button_frame.grid(row=6, column=0, sticky="e", pady=(12, 0))
 
     menubar = tk.Menu(root)
     file_menu = tk.Menu(menubar, tearoff=0)
-    file_menu.add_command(label="Exit", command=root.quit)
+    file_menu.add_command(label="Exit", command=lambda: shutdown())
     menubar.add_cascade(label="File", menu=file_menu)
 
     settings_menu = tk.Menu(menubar, tearoff=0)
     menubar.add_cascade(label="Settings", menu=settings_menu)
 
     help_menu = tk.Menu(menubar, tearoff=0)
-    help_menu.add_command(label="About", command=lambda: output_queue.put(("status", "Event Monitor Telemetry Publisher")))
+    help_menu.add_command(label="About", command=lambda: post_output(("status", "Event Monitor Telemetry Publisher")))
     menubar.add_cascade(label="Help", menu=help_menu)
 
     root.config(menu=menubar)
 
+    pending_log = []
+
     def append_log(message):
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        log_text.configure(state="normal")
-        log_text.insert("end", "{time} {message}\n".format(time=timestamp, message=message))
-        log_text.see("end")
-        log_text.configure(state="disabled")
+        pending_log.extend((local_log_timestamp() + " " + message).splitlines())
 
-    def is_sim_mode():
-        with mode_lock:
-            return sim_mode_enabled
+    def flush_log():
+        if not pending_log:
+            return
 
-    def is_publish_enabled():
-        with publish_lock:
-            return publish_enabled
+        log_listbox.insert("end", *pending_log)
+        line_count = log_listbox.size()
+        if line_count > LOG_MAX_LINES:
+            log_listbox.delete(0, line_count - LOG_TRIM_TO_LINES - 1)
+        log_listbox.see("end")
+        pending_log.clear()
 
     def get_config():
         with config_lock:
@@ -594,6 +872,9 @@ def main():
         with config_lock:
             config.update(new_config)
 
+    issued_series = {}
+    reserved_counts = {}
+
     def next_message_id(mode, event_type):
         with config_lock:
             device_prefix = "sim" if mode == "sim" else "rpi"
@@ -605,10 +886,19 @@ def main():
                 id_counters = {}
                 config["id_counters"] = id_counters
 
-            current_series = id_counters.get(counter_key, "AA00")
+            current_series = issued_series.get(counter_key) or id_counters.get(counter_key, "AA00")
             next_series = next_series_value(current_series)
-            id_counters[counter_key] = next_series
-            save_config(config, log)
+            issued_series[counter_key] = next_series
+
+            # Persist a block of IDs at a time so config.json is not rewritten for every event.
+            if reserved_counts.get(counter_key, 0) <= 0:
+                reserved_series = next_series
+                for _ in range(MESSAGE_ID_RESERVE_BLOCK - 1):
+                    reserved_series = next_series_value(reserved_series)
+                id_counters[counter_key] = reserved_series
+                reserved_counts[counter_key] = MESSAGE_ID_RESERVE_BLOCK
+                save_config(config, log)
+            reserved_counts[counter_key] -= 1
 
             return f"{device_prefix}-{type_code}-{next_series}"
 
@@ -718,20 +1008,20 @@ def main():
                     "duplicate_rate_percent": duplicate_rate_percent,
                 }
             except ValueError:
-                output_queue.put(("status", "Invalid configuration values"))
+                post_output(("status", "Invalid configuration values"))
                 return
 
             if updated_config["sim_min_temp"] > updated_config["sim_max_temp"]:
-                output_queue.put(("status", "Simulation min temp cannot exceed max temp"))
+                post_output(("status", "Simulation min temp cannot exceed max temp"))
                 return
 
             if updated_config["duplicate_rate_percent"] < 0 or updated_config["duplicate_rate_percent"] > 100:
-                output_queue.put(("status", "Duplicate rate must be between 0 and 100"))
+                post_output(("status", "Duplicate rate must be between 0 and 100"))
                 return
 
             set_config(updated_config)
             save_config(get_config(), log)
-            output_queue.put(("status", "Publisher configuration updated"))
+            post_output(("status", "Publisher configuration updated"))
             config_window.destroy()
 
         tk.Button(button_row, text="Save", command=save_and_close, width=10).pack(side="right", padx=(8, 0))
@@ -740,24 +1030,22 @@ def main():
     settings_menu.add_command(label="Configure Publisher", command=open_config_window)
 
     def update_mode_selection():
-        nonlocal sim_mode_enabled
         requested_mode = mode_var.get()
         requested_sim = requested_mode == "sim"
 
         if os.name == "nt" and not requested_sim:
             mode_var.set("sim")
             requested_sim = True
-            output_queue.put(("status", "Live mode is not supported on Windows; staying in Simulated"))
+            post_output(("status", "Live mode is not supported on Windows; staying in Simulated"))
 
-        with mode_lock:
-            sim_mode_enabled = requested_sim
+        sim_mode_enabled[0] = requested_sim
 
         mode_text = "Simulated mode selected" if requested_sim else "Live mode selected"
-        mode_state_label.config(text="Mode: {}".format("Simulated" if requested_sim else "Live"))
-        output_queue.put(("status", mode_text))
+        mode_state_label.config(text=f"Mode: {'Simulated' if requested_sim else 'Live'}")
+        post_output(("status", mode_text))
 
     def set_publish_ui_state():
-        if is_publish_enabled():
+        if publish_enabled[0]:
             publish_button.config(text="Disable Publishing")
             publish_state_label.config(text="Publishing: ON")
         else:
@@ -765,15 +1053,13 @@ def main():
             publish_state_label.config(text="Publishing: OFF")
 
     def toggle_publish_state():
-        nonlocal publish_enabled
-        with publish_lock:
-            publish_enabled = not publish_enabled
-            now_enabled = publish_enabled
+        now_enabled = not publish_enabled[0]
+        publish_enabled[0] = now_enabled
         set_publish_ui_state()
         if now_enabled:
-            output_queue.put(("status", "Publish enabled"))
+            post_output(("status", "Publish enabled"))
         else:
-            output_queue.put(("status", "Publish disabled: events will be spooled"))
+            post_output(("status", "Publish disabled: events will be spooled"))
 
     mode_var.trace_add("write", lambda *_: update_mode_selection())
     publish_button.config(command=toggle_publish_state)
@@ -787,83 +1073,120 @@ def main():
         publish_running.set()
         publish_thread = threading.Thread(
             target=publisher_worker,
-            args=(publish_running, publish_queue, output_queue, log, is_publish_enabled),
+            args=(publish_running, publish_queue, post_output, log, publish_enabled),
             daemon=True,
         )
         publish_thread.start()
 
-    def start_temp():
+    def start_temp_thread():
         nonlocal temp_thread
-        if temp_running.is_set():
-            return
-
-        ensure_publisher_thread()
-
-        temp_running.set()
+        temp_alive.set()
         temp_thread = threading.Thread(
-            target=temp_worker,
-            args=(temp_running, output_queue, publish_queue, log, is_sim_mode, is_publish_enabled, get_config, next_message_id),
+            target=temp_sampler,
+            args=(
+                temp_alive,
+                temp_start,
+                temp_stopped,
+                post_output,
+                post_temp,
+                publish_queue,
+                log,
+                sim_mode_enabled,
+                get_config,
+                next_message_id,
+            ),
             daemon=True,
         )
         temp_thread.start()
-        status_label.config(text="Status: Temp sensor started at {time}".format(time=datetime.now().strftime("%H:%M:%S")))
+
+    def start_temp():
+        if not temp_stopped.is_set():
+            return
+
+        ensure_publisher_thread()
+
+        temp_stopped.clear()
+        temp_start.set()
+        status_label.config(text=f"Status: Temp sensor started at {now_hms()}")
 
     def stop_temp():
-        if temp_running.is_set():
-            temp_running.clear()
-            status_label.config(text="Status: Temp sensor stopped at {time}".format(time=datetime.now().strftime("%H:%M:%S")))
+        if not temp_stopped.is_set():
+            temp_stopped.set()
+            status_label.config(text=f"Status: Temp sensor stopped at {now_hms()}")
 
     def process_queue():
         nonlocal last_temp
         nonlocal last_status
 
-        try:
-            while True:
-                message = output_queue.get_nowait()
-                if not message:
-                    continue
+        latest_status = None
+        ui_wake_pending[0] = False
 
-                if message[0] == "temp":
-                    _, temp_c, temp_f = message
-                    temp_label.config(text="{temp_c:.3f} C / {temp_f:.3f} F".format(temp_c=temp_c, temp_f=temp_f))
-                    current_temp = (round(temp_c, 3), round(temp_f, 3))
-                    if current_temp != last_temp:
-                        append_log("Temp changed to {temp_c:.3f} C / {temp_f:.3f} F".format(temp_c=temp_c, temp_f=temp_f))
-                        last_temp = current_temp
-
-                elif message[0] == "status":
-                    _, status = message
-                    if status != last_status:
-                        status_label.config(text="Status: {status}".format(status=status))
-                        append_log(status)
-                        log.info("status=%s", status)
-                        last_status = status
-
-                elif message[0] == "force_sim":
-                    _, status = message
-                    mode_var.set("sim")
-                    with mode_lock:
-                        sim_mode_enabled = True
-                    mode_state_label.config(text="Mode: Simulated")
-                    status_label.config(text="Status: {status}".format(status=status))
+        try:
+            current_temp = latest_reading.pop()
+        except IndexError:
+            pass
+        else:
+            if current_temp != last_temp:
+                milli_c, milli_f = current_temp
+                temp_text = f"{milli_c / 1000:.3f} C / {milli_f / 1000:.3f} F"
+                temp_label.config(text=temp_text)
+                append_log("Temp changed to " + temp_text)
+                last_temp = current_temp
+
+        while output_queue:
+            message = output_queue.popleft()
+            if not message:
+                continue
+
+            if message[0] == "status":
+                _, status = message
+                if status != last_status:
+                    latest_status = status
                     append_log(status)
                     log.info("status=%s", status)
                     last_status = status
 
-        except queue.Empty:
-            pass
+            elif message[0] == "force_sim":
+                _, status = message
+                mode_var.set("sim")
+                sim_mode_enabled[0] = True
+                mode_state_label.config(text="Mode: Simulated")
+                latest_status = status
+                append_log(status)
+                log.info("status=%s", status)
+                last_status = status
+
+        if latest_status is not None:
+            status_label.config(text=f"Status: {latest_status}")
 
-        root.after(200, process_queue)
+        flush_log()
+
+    def process_queue_heartbeat():
+        process_queue()
+        root.after(UI_HEARTBEAT_MS, process_queue_heartbeat)
+
+    def join_servicing_ui(thread, timeout):
+        # Keep servicing Tk so a worker blocked in event_generate can return.
+        deadline = time.monotonic() + timeout
+        while thread.is_alive() and time.monotonic() < deadline:
+            root.update()
+            thread.join(0.05)
 
     def shutdown():
-        temp_running.clear()
+        if ui_closing[0]:
+            return
+
+        ui_closing[0] = True
+        temp_stopped.set()
+        temp_alive.clear()
+        temp_start.set()
         publish_running.clear()
 
-        if temp_thread is not None and temp_thread.is_alive():
-            temp_thread.join(timeout=1.5)
+        if temp_thread is not None:
+            join_servicing_ui(temp_thread, 0.1)
 
-        if publish_thread is not None and publish_thread.is_alive():
-            publish_thread.join(timeout=1.5)
+        if publish_thread is not None:
+            join_servicing_ui(publish_thread, 1.5)
 
         root.destroy()
 
@@ -871,10 +1194,20 @@ def main():
     ttk.Button(button_frame, text="Stop Temp", command=stop_temp).grid(row=0, column=1, padx=(0, 8))
     ttk.Button(button_frame, text="Quit", command=shutdown).grid(row=0, column=2)
 
-    root.after(200, process_queue)
+    start_temp_thread()
+    root.bind("<<NewData>>", lambda _event: process_queue())
+    root.after(UI_HEARTBEAT_MS, process_queue_heartbeat)
     root.protocol("WM_DELETE_WINDOW", shutdown)
     root.mainloop()
 
+    if publish_thread is not None:
+        publish_thread.join(timeout=PUBLISH_RESULT_TIMEOUT_S + 1)
+
+    if log_listener is not None:
+        log_listener.stop()
+        for handler in log_listener.handlers:
+            handler.close()
+
 
 if __name__ == "__main__":
     main()
\ No newline at end of file